@@ -2,37 +2,48 @@ import os
 import sys
 import random
 # from PIL import Image, ImageDraw, ImageFont
-from svgwrite import Drawing, rgb
-from svgwrite.container import Group
 import json
-from math import sqrt
+from hashlib import blake2b
+from math import isqrt
+from xml.sax.saxutils import escape, quoteattr
 
 # Constants
 NMAX = 32
 ALPHABET = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+SVG_NAMESPACES = 'xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink"'
 
 
-# Mask functions for different shapes
+# Mask functions for different shapes. Each works out the masked spans of a
+# row once and assigns them as slices rather than testing every cell.
 def circle_mask(grid, nrows, ncols):
     """Circular mask on grid."""
     radius_squared = min(ncols, nrows) ** 2 // 4
     center_x, center_y = ncols // 2, nrows // 2
     for row in range(nrows):
-        for col in range(ncols):
-            if (row - center_y) ** 2 + (col - center_x) ** 2 > radius_squared:
-                grid[row][col] = '*'
+        remaining = radius_squared - (row - center_y) ** 2
+        if remaining < 0:
+            grid[row][:] = ['*'] * ncols
+            continue
+        # Columns within isqrt(remaining) of the centre are inside the circle.
+        half_width = isqrt(remaining)
+        first = max(center_x - half_width, 0)
+        last = min(center_x + half_width + 1, ncols)
+        grid[row][:first] = ['*'] * first
+        grid[row][last:] = ['*'] * (ncols - last)
 
 
 def squares_mask(grid, nrows, ncols):
     """Mask of overlapping squares on grid."""
     a = int(0.38 * min(ncols, nrows))
     center_x, center_y = ncols // 2, nrows // 2
+    left = max(center_x - a, 0)
+    right = min(center_x + a + 1, ncols)
     for row in range(nrows):
-        for col in range(ncols):
-            if a <= col < ncols - a and (row < center_y - a or row > center_y + a):
-                grid[row][col] = '*'
-            if a <= row < nrows - a and (col < center_x - a or col > center_x + a):
-                grid[row][col] = '*'
+        if row < center_y - a or row > center_y + a:
+            grid[row][a:ncols - a] = ['*'] * max(ncols - 2 * a, 0)
+        if a <= row < nrows - a:
+            grid[row][:left] = ['*'] * left
+            grid[row][right:] = ['*'] * (ncols - right)
 
 
 def no_mask(grid, nrows, ncols):
@@ -161,6 +172,33 @@ def display_grid_text(grid):
         print(" ".join(row))
 
 
+def svg_header(width, height):
+    """Returns the XML declaration and opening <svg> tag for a drawing of the given size."""
+    return (f'<?xml version="1.0" encoding="utf-8" ?>\n'
+            f'<svg height="{height}" version="1.1" width="{width}" {SVG_NAMESPACES}>')
+
+
+def text_group(font_size):
+    """Opens a <g> carrying the attributes shared by all centred black text, so each <text> only needs x and y."""
+    return f'<g dominant-baseline="central" fill="black" font-size="{font_size}" text-anchor="middle">'
+
+
+def grid_lines_path(start_x, start_y, cell_size, grid_size):
+    """Returns a single <path> drawing every cell border of a grid_size x grid_size grid."""
+    length = grid_size * cell_size
+    d = []
+    for i in range(grid_size + 1):
+        offset = i * cell_size
+        d.append(f'M{start_x} {start_y + offset}h{length}M{start_x + offset} {start_y}v{length}')
+    return f'<path d="{"".join(d)}" fill="none" stroke="black" />'
+
+
+def write_svg(filename, parts):
+    """Writes the accumulated SVG fragments to filename in a single call."""
+    with open(filename, "w", encoding="utf-8") as f:
+        f.write("".join(parts))
+
+
 '''
 def create_puzzle_image(filename, grid, wordlist, mask_type=None, page_number=None, background_image=None):
     """
@@ -459,10 +497,10 @@ def create_puzzle_svg(filename, grid, wordlist, mask_type=None, page_number=None
 '''
 
 
-def create_puzzle_svg(filename, grid, wordlist, mask_type=None, page_number=None):
+def _puzzle_page(grid_size, wordlist, mask_type=None, page_number=None):
     """
-    This function generates a puzzle page as an SVG with a grid of letters, an optional circle mask around the grid,
-    a list of hidden words, and a page number. The output is saved as an SVG file.
+    Lays out a puzzle page and returns the SVG fragments that go before and after the grid letters,
+    together with the letter centre coordinates and the table of cells that are drawn.
     """
     page_width, page_height = 2480, 3508  # A4 size in pixels at 300 DPI
     margin = 100
@@ -473,12 +511,6 @@ def create_puzzle_svg(filename, grid, wordlist, mask_type=None, page_number=None
     page_number_font_size = 30
     vertical_gap = 100  # Gap between grid and word list
 
-    if ".svg" not in filename:
-        filename += ".svg"
-
-    dwg = Drawing(filename, size=(page_width, page_height))
-
-    grid_size = len(grid)
     cell_size = min((page_width - 2 * margin) // grid_size,
                     (page_height // 2) // grid_size)
     grid_width = grid_size * cell_size
@@ -493,45 +525,44 @@ def create_puzzle_svg(filename, grid, wordlist, mask_type=None, page_number=None
     grid_start_x = (page_width - grid_width) // 2
     grid_start_y = vertical_offset
 
-    grid_group = Group()
+    head = [svg_header(page_width, page_height), text_group(grid_font_size)]
 
     center_x = grid_start_x + grid_width // 2
     center_y = grid_start_y + grid_height // 2
     radius = grid_width // 2 if grid_height > grid_width else grid_height // 2
 
-    for row in range(grid_size):
-        for col in range(grid_size):
-            cell_x = grid_start_x + col * cell_size
-            cell_y = grid_start_y + row * cell_size
-
-            if mask_type == "circle":
-                if sqrt((cell_x + cell_size / 2 - center_x)**2 + (cell_y + cell_size / 2 - center_y)**2) > radius:
-                    continue
+    # Cell corner and centre coordinates, computed once per row/column
+    col_x = [grid_start_x + col * cell_size for col in range(grid_size)]
+    row_y = [grid_start_y + row * cell_size for row in range(grid_size)]
+    col_cx = [x + cell_size // 2 for x in col_x]
+    row_cy = [y + cell_size // 2 for y in row_y]
 
-            char_x = cell_x + cell_size // 2
-            char_y = cell_y + cell_size // 2
-            grid_group.add(dwg.text(grid[row][col].upper(), insert=(char_x, char_y), text_anchor="middle",
-                                    alignment_baseline="central", font_size=grid_font_size, fill='black'))
+    # Cells whose exact centre lies inside the circle. Distances are doubled so
+    # the half-cell offset stays integral and no sqrt is needed.
+    if mask_type == "circle":
+        col_dx2 = [(2 * x + cell_size - 2 * center_x) ** 2 for x in col_x]
+        row_dy2 = [(2 * y + cell_size - 2 * center_y) ** 2 for y in row_y]
+        limit = (2 * radius) ** 2
+        inside_mask = [[dy2 + dx2 <= limit for dx2 in col_dx2] for dy2 in row_dy2]
+    else:
+        inside_mask = [[True] * grid_size for _ in range(grid_size)]
 
-    dwg.add(grid_group)
+    tail = ['</g>']
 
     if mask_type == "circle":
-        dwg.add(dwg.circle(center=(center_x, center_y), r=radius + 40,
-                fill='none', stroke='red', stroke_width=grid_outline_width))
+        tail.append(f'<circle cx="{center_x}" cy="{center_y}" fill="none" r="{radius + 40}" '
+                    f'stroke="red" stroke-width="{grid_outline_width}" />')
     else:
-        for row in range(grid_size):
-            for col in range(grid_size):
-                cell_x = grid_start_x + col * cell_size
-                cell_y = grid_start_y + row * cell_size
-                grid_group.add(dwg.rect(insert=(cell_x, cell_y), size=(
-                    cell_size, cell_size), fill='none', stroke='black'))
+        tail.append(grid_lines_path(grid_start_x, grid_start_y, cell_size, grid_size))
 
-        dwg.add(dwg.rect(insert=(grid_start_x, grid_start_y), size=(
-            grid_width, grid_height), fill='none', stroke='red', stroke_width=grid_outline_width))
+        tail.append(f'<rect fill="none" height="{grid_height}" stroke="red" stroke-width="{grid_outline_width}" '
+                    f'width="{grid_width}" x="{grid_start_x}" y="{grid_start_y}" />')
+
+    # Title, word list and page number share one text group
+    tail.append(text_group(words_font_size))
 
     title_y = grid_start_y + grid_height + vertical_gap
-    dwg.add(dwg.text("HIDDEN WORDS", insert=(page_width // 2, title_y), text_anchor="middle",
-                     alignment_baseline="central", font_size=title_font_size, fill='black'))
+    tail.append(f'<text font-size="{title_font_size}" x="{page_width // 2}" y="{title_y}">HIDDEN WORDS</text>')
 
     words_y = title_y + 80
     column_width = (page_width - 2 * margin) // 3
@@ -540,97 +571,109 @@ def create_puzzle_svg(filename, grid, wordlist, mask_type=None, page_number=None
         row = i // 3
         word_x = margin + col * column_width + column_width // 2
         word_y = words_y + row * 40
-        dwg.add(dwg.text(word.upper(), insert=(word_x, word_y), text_anchor="middle",
-                         alignment_baseline="central", font_size=words_font_size, fill='black'))
+        tail.append(f'<text x="{word_x}" y="{word_y}">{escape(word.upper())}</text>')
 
     if page_number is not None:
-        dwg.add(dwg.text(str(page_number), insert=(page_width // 2, page_height - 100), text_anchor="middle",
-                         alignment_baseline="central", font_size=page_number_font_size, fill='black'))
+        tail.append(f'<text font-size="{page_number_font_size}" x="{page_width // 2}" '
+                    f'y="{page_height - 100}">{escape(str(page_number))}</text>')
 
-    dwg.save()
+    tail.append('</g></svg>')
+    return head, tail, col_cx, row_cy, inside_mask
 
 
-def create_solution_svg(filename, grid, word_positions, mask_type=None):
-    grid_size = len(grid)
+def _solution_page(grid_size, word_positions, mask_type=None):
+    """
+    Lays out a solution page and returns the SVG fragments that go before and after the grid letters,
+    together with the letter centre coordinates.
+    """
     cell_size = 40
     padding = 20
     width = grid_size * cell_size + 2 * padding
     height = grid_size * cell_size + 2 * padding
 
-    if ".svg" not in filename:
-        filename += ".svg"
-
-    dwg = Drawing(filename, size=(width, height))
-
-    def draw_grid():
-        start_x = padding
-        start_y = padding
-        for y in range(grid_size):
-            for x in range(grid_size):
-                char = grid[y][x]
-                cell_x = start_x + x * cell_size
-                cell_y = start_y + y * cell_size
-                # Draw gridlines only if it's not a circular mask
-                if mask_type != "circle":
-                    dwg.add(dwg.rect(insert=(cell_x, cell_y), size=(
-                        cell_size, cell_size), fill='none', stroke='black'))
-                # Draw the character inside the grid
-                char_x = cell_x + cell_size // 2
-                char_y = cell_y + cell_size // 2
-                dwg.add(dwg.text(char.upper(), insert=(char_x, char_y), text_anchor="middle",
-                                 alignment_baseline="central", font_size=24, fill='black'))
+    font_size = 24
+    cell_rect_attrs = f'height="{cell_size}" width="{cell_size}"'
 
-    # Draw the grid (with characters) without gridlines for circle mask
-    draw_grid()
+    # Cell corner and centre coordinates, shared by the grid and the highlights
+    cell_pos = [padding + i * cell_size for i in range(grid_size)]
+    cell_mid = [pos + cell_size // 2 for pos in cell_pos]
 
-    def highlight_word(word, start_x, start_y, end_x, end_y, color):
-        for i in range(len(word)):
-            x_pos = start_x + i * \
-                (end_x - start_x) // (len(word) -
-                                      1) if start_x != end_x else start_x
-            y_pos = start_y + i * \
-                (end_y - start_y) // (len(word) -
-                                      1) if start_y != end_y else start_y
-            cell_x = padding + x_pos * cell_size
-            cell_y = padding + y_pos * cell_size
-            # Draw a colored rectangle to highlight the cell
-            dwg.add(dwg.rect(insert=(cell_x, cell_y), size=(
-                cell_size, cell_size), fill=rgb(*color), stroke='none'))
+    head = [svg_header(width, height)]
+    # Draw gridlines only if it's not a circular mask
+    if mask_type != "circle":
+        head.append(grid_lines_path(padding, padding, cell_size, grid_size))
+    head.append(text_group(font_size))
 
-    word_colors = {}
-    for word, (start_x, start_y, end_x, end_y) in word_positions.items():
-        if word not in word_colors:
-            word_colors[word] = tuple(random.randint(0, 255) for _ in range(3))
-        color = word_colors[word]
-        highlight_word(word, start_x, start_y, end_x, end_y, color)
+    tail = ['</g>']
 
-    # After highlighting, draw the letters on top of the highlights
+    # Walk every solution word once, collecting its highlight rects and its
+    # letters into separate buffers so the letters still land on top.
+    rect_buf = ['<g stroke="none">']
+    text_buf = [text_group(font_size)]
+    # Colour each word from a hash of its letters: stable across runs and cheaper than the RNG
+    word_colors = {word: "rgb(%d,%d,%d)" % tuple(blake2b(word.encode(), digest_size=3).digest())
+                   for word in word_positions}
     for word, (start_x, start_y, end_x, end_y) in word_positions.items():
-        color = word_colors[word]
+        fill = word_colors[word]
+        span_x = end_x - start_x
+        span_y = end_y - start_y
+        last = len(word) - 1
         for i in range(len(word)):
-            x_pos = start_x + i * \
-                (end_x - start_x) // (len(word) -
-                                      1) if start_x != end_x else start_x
-            y_pos = start_y + i * \
-                (end_y - start_y) // (len(word) -
-                                      1) if start_y != end_y else start_y
-            char_x = padding + x_pos * cell_size + cell_size // 2
-            char_y = padding + y_pos * cell_size + cell_size // 2
-            # Draw the text on top of the highlighted cell
-            dwg.add(dwg.text(word[i].upper(), insert=(char_x, char_y), text_anchor="middle",
-                             alignment_baseline="central", font_size=24, fill='black'))
+            x_pos = start_x + i * span_x // last if span_x else start_x
+            y_pos = start_y + i * span_y // last if span_y else start_y
+            # Highlight the cell, then draw the letter on top of it
+            rect_buf.append(f'<rect fill="{fill}" {cell_rect_attrs} x="{cell_pos[x_pos]}" y="{cell_pos[y_pos]}" />')
+            text_buf.append(f'<text x="{cell_mid[x_pos]}" y="{cell_mid[y_pos]}">{escape(word[i].upper())}</text>')
+    rect_buf.append('</g>')
+    text_buf.append('</g>')
+    tail += rect_buf
+    tail += text_buf
 
     if mask_type == "circle":
         grid_center_x = padding + grid_size * cell_size // 2
         grid_center_y = padding + grid_size * cell_size // 2
         radius = grid_size * cell_size // 2 + 20  # Increased radius by 10
-        dwg.add(dwg.circle(center=(grid_center_x, grid_center_y),
-                r=radius, fill='none', stroke='red', stroke_width=5))
+        tail.append(f'<circle cx="{grid_center_x}" cy="{grid_center_y}" fill="none" r="{radius}" '
+                    f'stroke="red" stroke-width="5" />')
     else:
-        dwg.add(dwg.rect(insert=(padding, padding), size=(grid_size * cell_size,
-                grid_size * cell_size), fill='none', stroke='red', stroke_width=5))
+        tail.append(f'<rect fill="none" height="{grid_size * cell_size}" stroke="red" stroke-width="5" '
+                    f'width="{grid_size * cell_size}" x="{padding}" y="{padding}" />')
 
-    dwg.save()
+    tail.append('</svg>')
+    return head, tail, cell_mid
+
+
+def write_puzzle_and_solution(puzzle_filename, solution_filename, grid, wordlist, word_positions,
+                              mask_type=None, page_number=None):
+    """
+    Writes the puzzle page and its solution page together as SVG files, walking the grid letters once
+    and emitting each letter into both pages.
+    """
+    if ".svg" not in puzzle_filename:
+        puzzle_filename += ".svg"
+    if ".svg" not in solution_filename:
+        solution_filename += ".svg"
+
+    grid_size = len(grid)
+    puzzle_buf, puzzle_tail, col_cx, row_cy, inside_mask = _puzzle_page(
+        grid_size, wordlist, mask_type, page_number)
+    solution_buf, solution_tail, cell_mid = _solution_page(grid_size, word_positions, mask_type)
+
+    for row in range(grid_size):
+        puzzle_y = row_cy[row]
+        solution_y = cell_mid[row]
+        inside_row = inside_mask[row]
+        grid_row = grid[row]
+        for col in range(grid_size):
+            char = escape(grid_row[col].upper())
+            if inside_row[col]:
+                puzzle_buf.append(f'<text x="{col_cx[col]}" y="{puzzle_y}">{char}</text>')
+            solution_buf.append(f'<text x="{cell_mid[col]}" y="{solution_y}">{char}</text>')
+
+    puzzle_buf += puzzle_tail
+    solution_buf += solution_tail
+    write_svg(puzzle_filename, puzzle_buf)
+    write_svg(solution_filename, solution_buf)
 
 
 def create_puzzle_and_solution(puzzle_filename, wordlist, nrows: int, ncols: int, mask_type=None, background_image=None, page_number=None):
@@ -646,13 +689,10 @@ def create_puzzle_and_solution(puzzle_filename, wordlist, nrows: int, ncols: int
         # Display the grid for debugging (optional)
         # display_grid_text(grid)
 
-        # Generate the puzzle image
-        create_puzzle_svg(puzzle_filename,  grid,
-                          wordlist, mask_type, page_number)
-
-        # Generate the solution image
+        # Generate the puzzle and solution images in one pass over the grid
         solution_filename = f"{puzzle_filename}S"
-        create_solution_svg(solution_filename, grid, word_positions, mask_type)
+        write_puzzle_and_solution(puzzle_filename, solution_filename, grid,
+                                  wordlist, word_positions, mask_type, page_number)
 
         print(f"Puzzle and solution generated: {
               puzzle_filename}.svg, {solution_filename}.svg")
@@ -750,16 +790,15 @@ def create_all_puzzles(word_json_path, background_image, puzzle_folder, start_pu
 
 
 def create_transition_svg(filename, topic_name, mode_name, background_image=None):
-    dwg = Drawing(filename, size=(2480, 3508))  # A4 size at 300 DPI
+    buf = [svg_header(2480, 3508)]  # A4 size at 300 DPI
 
     if background_image:
-        dwg.add(dwg.image(background_image, insert=(
-            0, 0), size=("2480px", "3508px")))
+        buf.append(f'<image height="3508px" width="2480px" x="0" xlink:href={quoteattr(background_image)} y="0" />')
 
     # Use Courier New for the topic name
     topic_font_size = 120
-    dwg.add(dwg.text(topic_name, insert=("50%", "33%"), text_anchor="middle",
-            font_size=topic_font_size, font_family="Courier New", font_weight="bold"))
+    buf.append(f'<text font-family="Courier New" font-size="{topic_font_size}" font-weight="bold" '
+               f'text-anchor="middle" x="50%" y="33%">{escape(topic_name)}</text>')
 
     # Adjust mode name for Bonus modes
     mode_name = mode_name.replace(
@@ -767,10 +806,11 @@ def create_transition_svg(filename, topic_name, mode_name, background_image=None
 
     # Use Times New Roman for the mode name
     mode_font_size = 80
-    dwg.add(dwg.text(mode_name, insert=("50%", "75%"), text_anchor="middle",
-            font_size=mode_font_size, font_family="Times New Roman", font_weight="bold"))
+    buf.append(f'<text font-family="Times New Roman" font-size="{mode_font_size}" font-weight="bold" '
+               f'text-anchor="middle" x="50%" y="75%">{escape(mode_name)}</text>')
 
-    dwg.save()
+    buf.append('</svg>')
+    write_svg(filename, buf)
 
 
 def create_individual_puzzle(files, word_json_path, puzzle_folder, background_image):
@@ -826,10 +866,8 @@ def main():
     if grid:
         display_grid_text(grid)
         base_filename = os.path.splitext(wordlist_filename)[0]
-        create_puzzle_svg(f"{base_filename}-puzzle.png",
-                          grid, wordlist, mask_type, 21)
-        create_solution_svg(f"{base_filename}-solution.png",
-                            grid, wordPositions, mask_type)
+        write_puzzle_and_solution(f"{base_filename}-puzzle.png", f"{base_filename}-solution.png",
+                                  grid, wordlist, wordPositions, mask_type, 21)
     else:
         print("Failed to generate word search after multiple attempts.")
 